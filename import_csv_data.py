@@ -1,10 +1,11 @@
 #!/usr/bin/env python3
 import os
 import sys
+import io
 import csv
+from contextlib import contextmanager
 import pandas as pd
-from django.db import transaction
-from datetime import datetime
+from django.db import connection, transaction
 
 # Setup Django environment
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -16,12 +17,64 @@ django.setup()
 from recommender.models import Movie, Rating, Watchlist
 from django.contrib.auth.models import User
 
+RATINGS_BATCH_SIZE = 5000  # Ratings per INSERT batch
+RATINGS_CHUNK_SIZE = 200_000  # CSV rows parsed per pandas chunk
+
+MOVIE_COLUMNS = ('title', 'genre', 'director', 'release_year', 'overview', 'poster_url', 'tmdb_id')
+RATING_COLUMNS = ('user_id', 'movie_id', 'rating', 'timestamp')
+
+def bulk_insert_rows(table, columns, rows):
+    """Insert plain row tuples without building ORM objects
+
+    PostgreSQL gets a single COPY FROM STDIN (psycopg2's copy_expert or
+    psycopg 3's copy); other databases get one executemany (INSERT OR IGNORE
+    on SQLite).
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            copy_sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+            if hasattr(cursor.cursor, 'copy_expert'):
+                # psycopg2
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(rows)
+                buffer.seek(0)
+                cursor.copy_expert(f"{copy_sql} WITH CSV", buffer)
+            else:
+                # psycopg 3
+                with cursor.cursor.copy(copy_sql) as copy:
+                    for row in rows:
+                        copy.write_row(row)
+        else:
+            insert = 'INSERT OR IGNORE' if connection.vendor == 'sqlite' else 'INSERT'
+            placeholders = ', '.join(['%s'] * len(columns))
+            cursor.executemany(
+                f"{insert} INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+                rows
+            )
+
+@contextmanager
+def fast_bulk_writes():
+    """Skip SQLite's fsync on every commit during the bulk import"""
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA synchronous")
+        previous = cursor.fetchone()[0]
+        cursor.execute("PRAGMA synchronous=OFF")
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA synchronous={int(previous)}")
+
 def import_movies():
-    """Import movies from movies.csv"""
+    """Import movies from movies.csv, returning a {MovieLens movieId: Movie pk} map"""
     print("Importing movies from movies.csv...")
     movies_file = "data/ml-20m/movies.csv"
     
-    movies_to_create = []
+    movie_rows = []
     with open(movies_file, 'r', encoding='utf-8') as file:
         reader = csv.DictReader(file)
         for row in reader:
@@ -40,66 +93,81 @@ def import_movies():
             genres = row['genres'].split('|')
             main_genre = genres[0] if genres else 'Unknown'
             
-            movie = Movie(
-                title=title,
-                genre=main_genre,
-                director='Unknown',  # CSV doesn't have director info
-                release_year=release_year or 0,
-                overview='No overview available',
-                poster_url=None,
-                tmdb_id=int(row['movieId'])  # Using movieId as tmdb_id for now
-            )
-            movies_to_create.append(movie)
+            movie_rows.append((
+                title,
+                main_genre,
+                'Unknown',  # CSV doesn't have director info
+                release_year or 0,
+                'No overview available',
+                None,
+                int(row['movieId'])  # Using movieId as tmdb_id for now
+            ))
+    
+    bulk_insert_rows(Movie._meta.db_table, MOVIE_COLUMNS, movie_rows)
+    print(f"Successfully imported {len(movie_rows)} movies")
+    
+    # tmdb_id still holds the MovieLens movieId here; import_links overwrites it later
+    return dict(Movie.objects.values_list('tmdb_id', 'id'))
+
+def resolve_user_pks(user_ids, user_pks):
+    """Create missing user_<id> accounts in bulk and record their pks in user_pks"""
+    usernames = {f'user_{user_id}': user_id for user_id in user_ids if user_id not in user_pks}
+    if not usernames:
+        return
     
-    # Bulk create in batches to avoid memory issues
-    batch_size = 1000
-    for i in range(0, len(movies_to_create), batch_size):
-        batch = movies_to_create[i:i + batch_size]
-        Movie.objects.bulk_create(batch, ignore_conflicts=True)
-        print(f"Created {min(i + batch_size, len(movies_to_create))} movies...")
+    User.objects.bulk_create(
+        [
+            User(username=username, email=f'{username}@example.com', password='defaultpass123')
+            for username in usernames
+        ],
+        batch_size=1000,
+        ignore_conflicts=True
+    )
     
-    print(f"Successfully imported {len(movies_to_create)} movies")
+    # Look the pks up in slices to stay under the database's query parameter limit
+    names = list(usernames)
+    for i in range(0, len(names), 900):
+        for username, pk in User.objects.filter(username__in=names[i:i + 900]).values_list('username', 'id'):
+            user_pks[usernames[username]] = pk
 
-def import_ratings():
+def import_ratings(ml_to_pk):
     """Import ratings from ratings.csv"""
     print("Importing ratings from ratings.csv...")
     ratings_file = "data/ml-20m/ratings.csv"
     
-    # Get all movies for mapping
-    movies_dict = {movie.tmdb_id: movie for movie in Movie.objects.all()}
+    # MovieLens userId -> User pk, so each user is looked up only once
+    user_pks = {}
     
-    ratings_to_create = []
-    with open(ratings_file, 'r', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            movie_id = int(row['movieId'])
-            user_id = int(row['userId'])
-            
-            # Get or create user
-            user, created = User.objects.get_or_create(
-                username=f'user_{user_id}',
-                defaults={'email': f'user_{user_id}@example.com', 'password': 'defaultpass123'}
-            )
-            
-            # Get movie
-            movie = movies_dict.get(movie_id)
-            if movie:
-                rating = Rating(
-                    user=user,
-                    movie=movie,
-                    rating=float(row['rating']),
-                    timestamp=datetime.fromtimestamp(int(row['timestamp']))
-                )
-                ratings_to_create.append(rating)
-    
-    # Bulk create in batches
-    batch_size = 1000
-    for i in range(0, len(ratings_to_create), batch_size):
-        batch = ratings_to_create[i:i + batch_size]
-        Rating.objects.bulk_create(batch, ignore_conflicts=True)
-        print(f"Created {min(i + batch_size, len(ratings_to_create))} ratings...")
-    
-    print(f"Successfully imported {len(ratings_to_create)} ratings")
+    imported_count = 0
+    chunks = pd.read_csv(
+        ratings_file,
+        usecols=['userId', 'movieId', 'rating', 'timestamp'],
+        dtype={'userId': 'i4', 'movieId': 'i4', 'rating': 'f4', 'timestamp': 'i8'},
+        chunksize=RATINGS_CHUNK_SIZE
+    )
+    for chunk in chunks:
+        # Map MovieLens ids to database pks vectorially, dropping unknown movies
+        chunk['movie_pk'] = chunk['movieId'].map(ml_to_pk)
+        chunk = chunk.dropna(subset=['movie_pk'])
+        
+        resolve_user_pks(chunk['userId'].unique().tolist(), user_pks)
+        chunk['user_pk'] = chunk['userId'].map(user_pks)
+        
+        # Naive UTC text, which both SQLite and PostgreSQL (UTC session) accept
+        timestamps = pd.to_datetime(chunk['timestamp'], unit='s').dt.strftime('%Y-%m-%d %H:%M:%S')
+        rating_rows = list(zip(
+            chunk['user_pk'].tolist(),
+            chunk['movie_pk'].astype('i8').tolist(),
+            chunk['rating'].tolist(),
+            timestamps.tolist()
+        ))
+        for i in range(0, len(rating_rows), RATINGS_BATCH_SIZE):
+            bulk_insert_rows(Rating._meta.db_table, RATING_COLUMNS, rating_rows[i:i + RATINGS_BATCH_SIZE])
+        
+        imported_count += len(rating_rows)
+        print(f"Created {imported_count} ratings...")
+    
+    print(f"Successfully imported {imported_count} ratings")
 
 def import_links():
     """Import links data and update movies with proper tmdb_id"""
@@ -178,21 +246,21 @@ def clear_existing_data():
     print("Existing data cleared successfully")
 
 @transaction.atomic
-def main():
-    """Main function to import all CSV data"""
+def import_all():
+    """Import all CSV data in a single transaction"""
     print("Starting CSV data import...")
     
     print("Step 0: Clearing existing data...")
     clear_existing_data()
     
     print("Step 1: Importing movies...")
-    import_movies()
+    ml_to_pk = import_movies()
     
     print("Step 2: Importing links and updating TMDb IDs...")
     import_links()
     
     print("Step 3: Importing ratings...")
-    import_ratings()
+    import_ratings(ml_to_pk)
     
     print("Step 4: Analyzing tags data...")
     import_tags()
@@ -205,5 +273,11 @@ def main():
     print(f"Total ratings in database: {Rating.objects.count()}")
     print(f"Total users in database: {User.objects.count()}")
 
+def main():
+    """Main function to import all CSV data"""
+    # SQLite only accepts the PRAGMA outside a transaction
+    with fast_bulk_writes():
+        import_all()
+
 if __name__ == '__main__':
     main()
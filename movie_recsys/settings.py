@@ -141,6 +141,33 @@ CACHES = {
     }
 }
 
+# Recommender engine
+RECOMMENDER_CACHE_DIR = BASE_DIR / 'recommender' / 'cache'
+RECOMMENDER_REBUILD_THRESHOLD = 100  # New ratings before the shared recommender is rebuilt
+RECOMMENDER_STALE_CHECK_INTERVAL = 30  # Seconds between checks for new ratings
+RECOMMENDER_WARMUP = True  # Build the recommender in the background when the server starts
+RECOMMENDER_SVD_MAX_UPDATES = 10  # Incremental SVD updates before a full retrain
+RECOMMENDER_SVD_UPDATE_MAX_FRACTION = 0.1  # New ratings, as a fraction of the trained ones, above which SVD is retrained
+RECOMMENDER_ANN_MIN_MOVIES = 5000  # Catalog size from which candidates come from an ANN index
+
+# Logging: recommender progress is logged instead of printed, and only
+# warnings and errors are kept outside of development
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'recommender': {
+            'handlers': ['console'],
+            'level': 'DEBUG' if DEBUG else 'WARNING',
+        },
+    },
+}
+
 # Static files configuration for production
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
@@ -1,6 +1,27 @@
+import os
+import sys
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class RecommenderConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recommender'
+
+    def ready(self):
+        # Build the shared recommender in the background so the first request doesn't pay for it
+        if settings.RECOMMENDER_WARMUP and _is_server_process():
+            from .recommender_engine import warm_up
+            threading.Thread(target=warm_up, name='recommender-warmup', daemon=True).start()
+
+
+def _is_server_process():
+    """True inside a process that serves requests (gunicorn or the runserver child)"""
+    if 'gunicorn' in os.path.basename(sys.argv[0]):
+        return True
+    if 'runserver' in sys.argv:
+        # With the autoreloader only the child process (RUN_MAIN) serves requests
+        return os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv
+    return False
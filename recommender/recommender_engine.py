@@ -1,27 +1,252 @@
 import pandas as pd
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+import joblib
+from numba import njit
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
 from surprise import SVD, Dataset, Reader
 from surprise.model_selection import train_test_split
+from django.conf import settings
 from django.db import connection
-import pickle
+from django.db.models import Count, Max, Q
+import hashlib
+import logging
 import os
+import tempfile
+import threading
+import time
 from pathlib import Path
 from .models import Movie, Rating, Watchlist
 from django.contrib.auth.models import User
 
 
+logger = logging.getLogger(__name__)
+
+
+# Columnar layout of the ratings table as loaded by HybridRecommender
+RATINGS_DTYPE = np.dtype([('id', 'i8'), ('user_id', 'i4'), ('movie_id', 'i4'), ('rating', 'f4')])
+
+@njit(cache=True, fastmath=True)
+def _score_and_topk(content, collab, watch, n):
+    """
+    Combine the hybrid score and select the n best candidates in one native kernel
+    
+    Args:
+        content: Content similarity (0-1) of each candidate
+        collab: Predicted rating of each candidate
+        watch: 1.0 for candidates in the user's watchlist, else 0.0
+        n: Number of candidates to keep
+        
+    Returns:
+        Tuple of (candidate positions, hybrid scores), best first
+    """
+    scores = 0.4 * 5.0 * content + 0.6 * collab + 0.2 * watch
+    if n <= 0:
+        return np.empty(0, dtype=np.int64), scores[:0]
+    
+    if n < len(scores):
+        # Partial sort finds the n-th best score. Everything strictly better is
+        # kept, and ties at that score fill the remaining slots in catalog order,
+        # so at most n candidates get sorted even when most scores are equal
+        threshold = np.partition(-scores, n - 1)[n - 1]
+        better = np.flatnonzero(-scores < threshold)
+        ties = np.flatnonzero(-scores == threshold)[:n - len(better)]
+        candidates = np.concatenate((better, ties))
+    else:
+        candidates = np.arange(len(scores))
+    
+    order = np.argsort(-scores[candidates], kind='mergesort')
+    top = candidates[order][:n]
+    return top, scores[top]
+
+
+def _ratings_checksum(ids, users, movies, values):
+    """Order-independent 64-bit checksum of rating rows, sensitive to any edited field"""
+    h = ids.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+    h ^= users.astype(np.uint64) * np.uint64(0xC2B2AE3D27D4EB4F)
+    h ^= movies.astype(np.uint64) * np.uint64(0x165667B19E3779F9)
+    h ^= values.astype(np.float32).view(np.uint32).astype(np.uint64) * np.uint64(0x27D4EB2F165667C5)
+    # Final mix so that the per-row hashes do not cancel out in the sum
+    h ^= h >> np.uint64(31)
+    h *= np.uint64(0xBF58476D1CE4E5B9)
+    h ^= h >> np.uint64(29)
+    return int(h.sum(dtype=np.uint64))
+
+
+def _write_cache_atomically(cache_file, write):
+    """
+    Write a cache file under a temporary name, then rename it into place
+    
+    Several server processes may build the same cache at once; the rename
+    means readers only ever see a complete file (the old one or the new one).
+    
+    Args:
+        cache_file: Final path of the cache file
+        write: Callable writing the cache to the path it is given
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=cache_file.parent, prefix=f".{cache_file.stem}-", suffix=cache_file.suffix)
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, cache_file)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _quantize_rows(matrix):
+    """Symmetric per-row int8 quantization, matrix ~= q * scale[:, None]"""
+    scale = np.abs(matrix).max(axis=1) / 127
+    scale[scale == 0] = 1.0
+    q = np.round(matrix / scale[:, None]).astype(np.int8)
+    return q, scale.astype(np.float32)
+
+
+@njit(cache=True)
+def _int8_row_dots(q_rows, row_indices, q_vector):
+    """Dot products of selected int8 rows with an int8 vector, accumulated in int32"""
+    out = np.empty(len(row_indices), dtype=np.int32)
+    for i in range(len(row_indices)):
+        row = q_rows[row_indices[i]]
+        acc = np.int32(0)
+        for j in range(len(q_vector)):
+            acc += np.int32(row[j]) * np.int32(q_vector[j])
+        out[i] = acc
+    return out
+
+
+# Warm-start SGD settings for folding new ratings into cached SVD factors
+# (learning rate, regularization and init spread match Surprise's SVD defaults)
+SVD_UPDATE_EPOCHS = 2
+SVD_LEARNING_RATE = 0.005
+SVD_REGULARIZATION = 0.02
+SVD_INIT_STD = 0.1
+
+
+@njit(cache=True)
+def _sgd_update(users, items, ratings, global_mean, bu, bi, pu, qi, n_epochs, lr, reg):
+    """Run biased-SVD SGD epochs over the given ratings, updating bu/bi/pu/qi in place"""
+    for _ in range(n_epochs):
+        for k in range(len(ratings)):
+            u = users[k]
+            i = items[k]
+            dot = 0.0
+            for f in range(pu.shape[1]):
+                dot += qi[i, f] * pu[u, f]
+            err = ratings[k] - (global_mean + bu[u] + bi[i] + dot)
+            
+            bu[u] += lr * (err - reg * bu[u])
+            bi[i] += lr * (err - reg * bi[i])
+            for f in range(pu.shape[1]):
+                puf = pu[u, f]
+                qif = qi[i, f]
+                pu[u, f] += lr * (err * qif - reg * puf)
+                qi[i, f] += lr * (err * puf - reg * qif)
+
+
+# Candidates taken from each ANN / content shortlist per requested recommendation
+ANN_CANDIDATE_FACTOR = 10
+
+
+def _build_item_index(qi_q, qi_scale, bi):
+    """Build an HNSW inner-product index over the SVD item factors"""
+    # faiss is only needed for catalogs large enough to use the index
+    import faiss
+    
+    # Searching [qi, bi] with [pu, 1] ranks items by bi + qi . pu, which is
+    # the collaborative estimate minus the per-user constant global_mean + bu
+    qi = qi_q * qi_scale[:, None]
+    item_vectors = np.hstack([qi, bi[:, None]]).astype(np.float32)
+    index = faiss.IndexHNSWFlat(item_vectors.shape[1], 32, faiss.METRIC_INNER_PRODUCT)
+    index.add(item_vectors)
+    return index
+
+
+# Process-wide recommender shared by all requests (see get_recommender)
+_INSTANCE = None
+_INSTANCE_LOCK = threading.Lock()  # Guards the first build
+_REBUILD_LOCK = threading.Lock()  # Held by the one thread rebuilding a stale instance
+
+
+def get_recommender():
+    """
+    Get the shared HybridRecommender, building it on first use
+    
+    The instance is rebuilt once more than RECOMMENDER_REBUILD_THRESHOLD
+    ratings have been added or removed since it loaded its data. The rebuild
+    runs in a background thread; requests keep using the current instance
+    until it is replaced.
+    """
+    global _INSTANCE
+    
+    instance = _INSTANCE
+    if instance is None:
+        with _INSTANCE_LOCK:
+            # Another thread may have built it while we waited for the lock
+            if _INSTANCE is None:
+                _INSTANCE = HybridRecommender()
+            return _INSTANCE
+    
+    if instance.is_stale() and _REBUILD_LOCK.acquire(blocking=False):
+        # The lock is released by the rebuild thread once it is done
+        threading.Thread(target=_rebuild, name='recommender-rebuild', daemon=True).start()
+    return instance
+
+
+def _rebuild():
+    """Build a fresh recommender and swap it in (runs holding _REBUILD_LOCK)"""
+    global _INSTANCE
+    
+    try:
+        _INSTANCE = HybridRecommender()
+    except Exception as e:
+        logger.exception("Recommender rebuild failed: %s", e)
+    finally:
+        _REBUILD_LOCK.release()
+        connection.close()
+
+
+def warm_up():
+    """Build the shared recommender ahead of the first request"""
+    try:
+        get_recommender()
+        # Load (or compile) the scoring kernels too
+        scores = np.zeros(1, dtype=np.float64)  # Same dtypes as get_recommendations_fast
+        _score_and_topk(scores, scores, scores, 1)
+        _int8_row_dots(np.zeros((1, 1), dtype=np.int8), np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int8))
+    except Exception as e:
+        logger.exception("Recommender warm-up failed: %s", e)
+    finally:
+        connection.close()
+
+
 class HybridRecommender:
     def __init__(self):
         self.movies_df = None
-        self.ratings_df = None
+        self.movie_id_to_idx = None
+        self.rating_id = None
+        self.rating_user = None
+        self.rating_movie = None
+        self.rating_value = None
+        self.rating_max_id = 0
+        self.ratings_fingerprint = None
+        self.movie_rating_stats = None
+        self.popular_movie_ids = None
         self.tfidf_vectorizer = None
+        self.tfidf_transformer = None
         self.tfidf_matrix = None
-        self.content_similarity = None
-        self.svd_model = None
-        self.cache_dir = Path('recommender/cache')
-        self.cache_dir.mkdir(exist_ok=True)
+        self.pu_q = None
+        self.pu_scale = None
+        self.qi_q = None
+        self.qi_scale = None
+        self.bu = None
+        self.bi = None
+        self.global_mean = None
+        self.svd_updates = 0
+        self.item_index = None
+        self._stale_checked_at = None
+        self.cache_dir = Path(settings.RECOMMENDER_CACHE_DIR)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
         
         # Tải dữ liệu và xây dựng mô hình
         self._load_data()
@@ -29,95 +254,160 @@ class HybridRecommender:
         self._build_collaborative_model()
     
     def _load_data(self):
-        """Tải dữ liệu từ cơ sở dữ liệu sử dụng pandas"""
-        print("Đang tải dữ liệu từ cơ sở dữ liệu...")
-        
-        # Tải phim
-        movies_query = """
-        SELECT id, title, genre, overview, tmdb_id 
-        FROM recommender_movie
-        """
-        self.movies_df = pd.read_sql_query(movies_query, connection)
-        
-        # Tải đánh giá
-        ratings_query = """
-        SELECT id, user_id, movie_id, rating, timestamp 
-        FROM recommender_rating
-        """
-        self.ratings_df = pd.read_sql_query(ratings_query, connection)
+        """Tải dữ liệu từ cơ sở dữ liệu, chỉ lấy các cột cần dùng"""
+        logger.info("Đang tải dữ liệu từ cơ sở dữ liệu...")
         
-        # Tải danh sách theo dõi
-        watchlist_query = """
-        SELECT id, user_id, movie_id, added_at 
-        FROM recommender_watchlist
-        """
-        self.watchlist_df = pd.read_sql_query(watchlist_query, connection)
-        
-        print(f"Đã tải {len(self.movies_df)} phim, {len(self.ratings_df)} đánh giá, và {len(self.watchlist_df)} mục trong danh sách theo dõi")
+        with connection.cursor() as cursor:
+            # Tải phim
+            cursor.execute("SELECT id, genre, overview FROM recommender_movie ORDER BY id")
+            self.movies_df = pd.DataFrame(cursor.fetchall(), columns=['id', 'genre', 'overview'])
+            
+            # Tải đánh giá thẳng vào mảng numpy có cấu trúc
+            cursor.execute("SELECT id, user_id, movie_id, rating FROM recommender_rating")
+            ratings = np.array(cursor.fetchall(), dtype=RATINGS_DTYPE)
+        
+        # The requesting user's own ratings and watchlist are read per request
+        # (see get_recommendations_fast), so they are not loaded here
+        
+        # Flat movie id -> movies_df row lookup (-1 for ids not in the catalog)
+        movie_ids = self.movies_df['id'].to_numpy(dtype=np.int64)
+        self.movie_id_to_idx = np.full(movie_ids.max() + 1 if len(movie_ids) else 0, -1, dtype=np.int32)
+        self.movie_id_to_idx[movie_ids] = np.arange(len(movie_ids), dtype=np.int32)
+        
+        # Split the records into one contiguous array per column (SoA), so
+        # the reductions below stream over packed memory instead of strided fields
+        self.rating_id = ratings['id'].copy()
+        self.rating_user = ratings['user_id'].copy()
+        self.rating_movie = ratings['movie_id'].copy()
+        self.rating_value = ratings['rating'].copy()
+        
+        self._build_popularity()
+        
+        # Highest rating id seen by this instance: ratings added later have
+        # larger ids, which is what is_stale() counts
+        self.rating_max_id = int(self.rating_id.max()) if len(self.rating_id) else 0
+        
+        # (count, max id, checksum) of the loaded ratings; the SVD cache is only
+        # reused for exactly the data it was trained on
+        self.ratings_fingerprint = np.array([
+            len(self.rating_id),
+            self.rating_max_id,
+            _ratings_checksum(self.rating_id, self.rating_user, self.rating_movie, self.rating_value),
+        ], dtype=np.uint64)
+        self._stale_checked_at = time.monotonic()
+        
+        logger.info("Đã tải %d phim và %d đánh giá", len(self.movies_df), len(self.rating_value))
+    
+    def _build_popularity(self):
+        """Rank rated movies by popularity once, instead of on every cold-start request"""
+        # Sort by movie once so each movie's ratings form one contiguous run,
+        # then reduce every run in a single pass (no hashing, no id-sized bins)
+        order = np.argsort(self.rating_movie, kind='stable')
+        movies_sorted = self.rating_movie[order]
+        ratings_sorted = self.rating_value[order].astype(np.float64)
+        
+        run_starts = np.r_[0, np.flatnonzero(np.diff(movies_sorted)) + 1] if len(movies_sorted) else np.zeros(0, dtype=np.int64)
+        rated_movie_ids = movies_sorted[run_starts]
+        rating_sums = np.add.reduceat(ratings_sorted, run_starts) if len(run_starts) else np.zeros(0)
+        rating_counts = np.diff(np.r_[run_starts, len(movies_sorted)])
+        self.movie_rating_stats = (rated_movie_ids, rating_sums, rating_counts)
+        
+        # Popularity = rating count * average rating, i.e. the sum of ratings
+        self.popular_movie_ids = rated_movie_ids[np.argsort(-rating_sums, kind='stable')]
     
     def _build_content_model(self):
         """Build content-based model using TF-IDF on genre + overview"""
-        cache_file = self.cache_dir / 'content_model.pkl'
+        cache_file = self.cache_dir / 'content_model.joblib'
         
         if cache_file.exists():
-            print("Loading cached content model...")
-            with open(cache_file, 'rb') as f:
-                cache_data = pickle.load(f)
+            logger.info("Loading cached content model...")
+            # Memory-map the sparse arrays so only the rows actually used get paged in
+            cache_data = joblib.load(cache_file, mmap_mode='r')
+            
+            # A cache built for a different catalog (movies added, removed or
+            # with new genre/overview text) would have misaligned rows
+            if cache_data.get('fingerprint') == self._content_fingerprint():
                 self.tfidf_vectorizer = cache_data['vectorizer']
+                self.tfidf_transformer = cache_data.get('transformer')
                 self.tfidf_matrix = cache_data['matrix']
-                self.content_similarity = cache_data['similarity']
-            return
+                return
+            logger.info("Cached content model is stale, rebuilding...")
         
-        print("Building content-based model...")
+        logger.info("Building content-based model...")
         
         # Combine genre and overview for TF-IDF
         self.movies_df['content'] = self.movies_df['genre'].fillna('') + ' ' + self.movies_df['overview'].fillna('')
         
-        # Create TF-IDF vectorizer
-        self.tfidf_vectorizer = TfidfVectorizer(
+        # Hash terms straight to columns: single pass, no vocabulary to build,
+        # and float32 output
+        self.tfidf_vectorizer = HashingVectorizer(
             stop_words='english',
-            max_features=5000,
-            ngram_range=(1, 2)
+            n_features=2 ** 14,
+            ngram_range=(1, 2),
+            alternate_sign=False,
+            norm=None,
+            dtype=np.float32
         )
+        term_counts = self.tfidf_vectorizer.transform(self.movies_df['content'])
         
-        # Fit and transform
-        self.tfidf_matrix = self.tfidf_vectorizer.fit_transform(self.movies_df['content'])
-        
-        # Compute cosine similarity
-        self.content_similarity = cosine_similarity(self.tfidf_matrix, self.tfidf_matrix)
+        # Apply IDF weighting on top of the hashed term counts. The transformer
+        # L2-normalizes rows (norm='l2') and keeps the float32 CSR input, so
+        # cosine similarity is a plain sparse dot product; similarities are
+        # computed on demand instead of as a dense N x N matrix
+        self.tfidf_transformer = TfidfTransformer(norm='l2', sublinear_tf=True)
+        self.tfidf_matrix = self.tfidf_transformer.fit_transform(term_counts)
         
-        # Cache the model
+        # Cache the model uncompressed so it can be memory-mapped on load
         cache_data = {
             'vectorizer': self.tfidf_vectorizer,
+            'transformer': self.tfidf_transformer,
             'matrix': self.tfidf_matrix,
-            'similarity': self.content_similarity
+            'fingerprint': self._content_fingerprint()
         }
-        with open(cache_file, 'wb') as f:
-            pickle.dump(cache_data, f)
+        _write_cache_atomically(cache_file, lambda path: joblib.dump(cache_data, path, compress=0))
         
-        print("Content-based model built and cached")
+        logger.info("Content-based model built and cached")
+    
+    def _content_fingerprint(self):
+        """Hash of the movie ids and the text the TF-IDF matrix is built from"""
+        hashed = pd.util.hash_pandas_object(self.movies_df[['id', 'genre', 'overview']], index=False)
+        return hashlib.sha1(hashed.to_numpy().tobytes()).hexdigest()
     
     def _build_collaborative_model(self):
         """Build collaborative filtering model using SVD"""
-        cache_file = self.cache_dir / 'svd_model.pkl'
+        cache_file = self.cache_dir / 'svd_factors.npz'
         
+        previous = None
         if cache_file.exists():
-            print("Loading cached SVD model...")
-            with open(cache_file, 'rb') as f:
-                self.svd_model = pickle.load(f)
+            with np.load(cache_file) as factors:
+                previous = dict(factors)
+        
+        if previous is not None and np.array_equal(previous.get('ratings_fingerprint'), self.ratings_fingerprint):
+            logger.info("Loading cached SVD factors...")
+            self._set_svd_factors(previous)
             return
         
-        print("Building collaborative filtering model...")
+        if len(self.rating_value) < 100:
+            logger.info("Not enough ratings for collaborative filtering, using dummy model")
+            return
         
-        if len(self.ratings_df) < 100:
-            print("Not enough ratings for collaborative filtering, using dummy model")
-            self.svd_model = None
+        # A stale cache still holds a good starting point: fold only the
+        # ratings added since it was trained into it instead of retraining
+        new_rows = self._get_svd_update_rows(previous)
+        if new_rows is not None:
+            self._update_svd_factors(cache_file, previous, new_rows)
             return
         
+        logger.info("Building collaborative filtering model...")
+        
         # Prepare data for Surprise
         reader = Reader(rating_scale=(1, 5))
         data = Dataset.load_from_df(
-            self.ratings_df[['user_id', 'movie_id', 'rating']], 
+            pd.DataFrame({
+                'user_id': self.rating_user,
+                'movie_id': self.rating_movie,
+                'rating': self.rating_value,
+            }),
             reader
         )
         
@@ -125,112 +415,333 @@ class HybridRecommender:
         trainset, _ = train_test_split(data, test_size=0.2, random_state=42)
         
         # Train SVD model
-        self.svd_model = SVD(n_factors=50, n_epochs=20, random_state=42)
-        self.svd_model.fit(trainset)
+        svd_model = SVD(n_factors=50, n_epochs=20, random_state=42)
+        svd_model.fit(trainset)
+        
+        self._save_svd_factors(cache_file, {
+            'pu': svd_model.pu,
+            'qi': svd_model.qi,
+            'bu': svd_model.bu,
+            'bi': svd_model.bi,
+            'global_mean': trainset.global_mean,
+            'rating_scale': np.array(trainset.rating_scale),
+            'user_ids': np.array([trainset.to_raw_uid(inner) for inner in trainset.all_users()]),
+            'item_ids': np.array([trainset.to_raw_iid(inner) for inner in trainset.all_items()]),
+            'svd_updates': 0,
+        })
+        
+        logger.info("Collaborative filtering model built and cached")
+    
+    def _get_svd_update_rows(self, previous):
+        """
+        Rating rows to warm-start cached SVD factors with, or None for a full retrain
+        
+        A warm start is only valid when every rating the factors were trained
+        on is still there unchanged (no edits, deletions or re-imports) and the
+        new ratings are few. Repeated updates are capped so that drift from
+        the full model stays bounded.
+        """
+        if previous is None or 'ratings_fingerprint' not in previous:
+            return None
+        
+        if int(previous.get('svd_updates', 0)) >= settings.RECOMMENDER_SVD_MAX_UPDATES:
+            logger.info("SVD factors reached the incremental update limit, retraining")
+            return None
+        
+        trained_count, trained_max_id, trained_checksum = (int(v) for v in previous['ratings_fingerprint'])
+        trained = self.rating_id <= trained_max_id
+        if trained.sum() != trained_count or _ratings_checksum(
+            self.rating_id[trained], self.rating_user[trained],
+            self.rating_movie[trained], self.rating_value[trained]
+        ) != trained_checksum:
+            logger.info("Ratings behind the cached SVD factors changed, retraining")
+            return None
+        
+        # Ratings added since, oldest first
+        new_rows = np.flatnonzero(~trained)
+        new_rows = new_rows[np.argsort(self.rating_id[new_rows], kind='stable')]
+        if len(new_rows) > settings.RECOMMENDER_SVD_UPDATE_MAX_FRACTION * trained_count:
+            logger.info("Too many new ratings for an incremental SVD update, retraining")
+            return None
+        return new_rows
+    
+    def _update_svd_factors(self, cache_file, previous, new_rows):
+        """
+        Warm-start the cached SVD factors with the ratings added since they were trained
+        
+        Surprise's SVD.fit always re-initializes its factors, so the update runs
+        a few SGD epochs of the same model directly over the new ratings only.
+        
+        Args:
+            cache_file: Path the updated factors are saved to
+            previous: Factors dict loaded from the stale cache
+            new_rows: Rows of the loaded rating arrays added since (see _get_svd_update_rows)
+        """
+        logger.info("Updating collaborative filtering model with new ratings...")
+        
+        # Dequantize to float64 working copies
+        pu = previous['pu_q'] * previous['pu_scale'][:, None].astype(np.float64)
+        qi = previous['qi_q'] * previous['qi_scale'][:, None].astype(np.float64)
+        bu = previous['bu'].astype(np.float64)
+        bi = previous['bi'].astype(np.float64)
+        user_ids = previous['user_ids'].tolist()
+        item_ids = previous['item_ids'].tolist()
+        
+        # Map raw ids to inner ids, appending users/movies the model has not seen
+        user_index = {raw_id: inner for inner, raw_id in enumerate(user_ids)}
+        item_index = {raw_id: inner for inner, raw_id in enumerate(item_ids)}
+        users = np.array(
+            [user_index.setdefault(raw_id, len(user_index)) for raw_id in self.rating_user[new_rows].tolist()],
+            dtype=np.int64
+        )
+        items = np.array(
+            [item_index.setdefault(raw_id, len(item_index)) for raw_id in self.rating_movie[new_rows].tolist()],
+            dtype=np.int64
+        )
+        user_ids.extend(list(user_index)[len(user_ids):])
+        item_ids.extend(list(item_index)[len(item_ids):])
+        
+        # New users/movies start like Surprise initializes them
+        rng = np.random.default_rng(42)
+        n_factors = pu.shape[1]
+        pu = np.vstack([pu, rng.normal(0, SVD_INIT_STD, (len(user_ids) - len(pu), n_factors))])
+        qi = np.vstack([qi, rng.normal(0, SVD_INIT_STD, (len(item_ids) - len(qi), n_factors))])
+        bu = np.concatenate([bu, np.zeros(len(user_ids) - len(bu))])
+        bi = np.concatenate([bi, np.zeros(len(item_ids) - len(bi))])
+        
+        # Follow the mean of the current ratings rather than freezing the old one
+        global_mean = float(self.rating_value.mean(dtype=np.float64))
+        values = self.rating_value[new_rows].astype(np.float64)
+        _sgd_update(users, items, values, global_mean, bu, bi, pu, qi,
+                    SVD_UPDATE_EPOCHS, SVD_LEARNING_RATE, SVD_REGULARIZATION)
+        
+        self._save_svd_factors(cache_file, {
+            'pu': pu,
+            'qi': qi,
+            'bu': bu,
+            'bi': bi,
+            'global_mean': global_mean,
+            'rating_scale': previous['rating_scale'],
+            'user_ids': np.array(user_ids),
+            'item_ids': np.array(item_ids),
+            'svd_updates': int(previous.get('svd_updates', 0)) + 1,
+        })
+        
+        logger.info("Collaborative filtering model updated with %d new ratings", len(new_rows))
+    
+    def _save_svd_factors(self, cache_file, model):
+        """Quantize trained SVD parameters, cache them and load them for scoring"""
+        # Only the factors are needed for scoring, so cache those instead of
+        # pickling the Surprise model. pu/qi are stored as per-row scaled int8:
+        # a quarter of the size, and plenty of precision for ranking
+        pu_q, pu_scale = _quantize_rows(model['pu'])
+        qi_q, qi_scale = _quantize_rows(model['qi'])
+        factors = {
+            'pu_q': pu_q,
+            'pu_scale': pu_scale,
+            'qi_q': qi_q,
+            'qi_scale': qi_scale,
+            'bu': model['bu'],
+            'bi': model['bi'],
+            'global_mean': model['global_mean'],
+            'rating_scale': model['rating_scale'],
+            'user_ids': model['user_ids'],
+            'item_ids': model['item_ids'],
+            # Ratings the factors were built from, compared on load and used
+            # to find the ratings added since
+            'ratings_fingerprint': self.ratings_fingerprint,
+            # Incremental updates since the last full retrain
+            'svd_updates': np.array(model['svd_updates']),
+        }
+        if len(self.movies_df) >= settings.RECOMMENDER_ANN_MIN_MOVIES:
+            import faiss
+            # Persist the HNSW graph inside the same file as the factors it
+            # indexes, so loads skip rebuilding it and can never pair it with
+            # other factors
+            factors['item_index'] = faiss.serialize_index(_build_item_index(qi_q, qi_scale, model['bi']))
+        _write_cache_atomically(cache_file, lambda path: np.savez(path, **factors))
+        
+        self._set_svd_factors(factors)
+    
+    def is_stale(self):
+        """
+        Check whether the catalog or enough ratings changed to warrant rebuilding the models
         
-        # Cache the model
-        with open(cache_file, 'wb') as f:
-            pickle.dump(self.svd_model, f)
+        Ratings added since load are counted by id (primary key index, not an
+        unindexed timestamp scan), and the check runs at most once every
+        RECOMMENDER_STALE_CHECK_INTERVAL seconds.
+        """
+        now = time.monotonic()
+        if now - self._stale_checked_at < settings.RECOMMENDER_STALE_CHECK_INTERVAL:
+            return False
+        self._stale_checked_at = now
+        
+        # Any added or removed movie: it would be missing from (or stale in) the models
+        movies = Movie.objects.aggregate(total=Count('id'), max_id=Max('id'))
+        loaded_max_id = len(self.movie_id_to_idx) - 1 if len(self.movie_id_to_idx) else None
+        if movies['total'] != len(self.movies_df) or movies['max_id'] != loaded_max_id:
+            return True
+        
+        counts = Rating.objects.aggregate(
+            total=Count('id'),
+            added=Count('id', filter=Q(id__gt=self.rating_max_id))
+        )
+        removed = len(self.rating_id) + counts['added'] - counts['total']
+        return counts['added'] + removed > settings.RECOMMENDER_REBUILD_THRESHOLD
+    
+    def _set_svd_factors(self, factors):
+        """Keep the SVD factors as plain arrays so scoring bypasses Surprise's predict()"""
+        self.pu_q = factors['pu_q']
+        self.pu_scale = factors['pu_scale']
+        self.qi_q = factors['qi_q']
+        self.qi_scale = factors['qi_scale']
+        self.bu = factors['bu']
+        self.bi = factors['bi']
+        self.global_mean = float(factors['global_mean'])
+        self.rating_scale = tuple(factors['rating_scale'].tolist())
+        self.svd_updates = int(factors.get('svd_updates', 0))
+        
+        # Raw id -> inner id maps, plus the inner item id of every movies_df row
+        # (-1 for movies the model was not trained on)
+        self.svd_user_index = {raw_id: inner for inner, raw_id in enumerate(factors['user_ids'].tolist())}
+        self.svd_item_index = {raw_id: inner for inner, raw_id in enumerate(factors['item_ids'].tolist())}
+        self.movie_inner_ids = np.array(
+            [self.svd_item_index.get(movie_id, -1) for movie_id in self.movies_df['id']],
+            dtype=np.int64
+        )
         
-        print("Collaborative filtering model built and cached")
+        self.item_index = None
+        if len(self.movies_df) >= settings.RECOMMENDER_ANN_MIN_MOVIES:
+            self._load_item_index(factors)
     
-    def _get_content_scores(self, movie_idx, rated_movies=None):
-        """Get content-based similarity scores for a movie"""
-        if rated_movies:
-            # If user has rated movies, average similarity to all rated movies
-            similarities = []
-            for rated_movie_id in rated_movies:
-                rated_idx = self.movies_df[self.movies_df['id'] == rated_movie_id].index
-                if len(rated_idx) > 0:
-                    sim = self.content_similarity[movie_idx, rated_idx[0]]
-                    similarities.append(sim)
-            return np.mean(similarities) if similarities else 0
+    def _load_item_index(self, factors):
+        """Set up the HNSW item index, reusing the one cached with the factors"""
+        if 'item_index' in factors:
+            import faiss
+            self.item_index = faiss.deserialize_index(factors['item_index'])
         else:
-            # Return base similarity (not used in current logic)
-            return 0
+            self.item_index = _build_item_index(self.qi_q, self.qi_scale, self.bi)
+        
+        # movies_df row of every inner item id (-1 if the movie is gone)
+        known = self.movie_inner_ids >= 0
+        self.item_positions = np.full(len(self.qi_q), -1, dtype=np.int64)
+        self.item_positions[self.movie_inner_ids[known]] = np.flatnonzero(known)
     
-    def _get_collaborative_score(self, user_id, movie_id):
-        """Get collaborative filtering prediction for user-movie pair"""
-        if self.svd_model is None:
-            return 3.0  # Default rating if no model
-        
-        try:
-            prediction = self.svd_model.predict(user_id, movie_id)
-            return prediction.est
-        except:
-            return 3.0  # Default if prediction fails
+    def _get_ann_candidates(self, user_id, content_scores, rated_mask, n):
+        """
+        Shortlist unrated movies for exact hybrid scoring
+        
+        Combines the collaborative top-k from the item index with the content
+        top-k, so the exact score only runs over O(n) movies instead of the
+        whole catalog.
+        """
+        k = n * ANN_CANDIDATE_FACTOR + int(rated_mask.sum())
+        
+        # Unknown users get a zero factor vector, i.e. a ranking by item bias
+        query = np.zeros((1, self.qi_q.shape[1] + 1), dtype=np.float32)
+        inner_user = self.svd_user_index.get(user_id)
+        if inner_user is not None:
+            query[0, :-1] = self.pu_q[inner_user] * self.pu_scale[inner_user]
+        query[0, -1] = 1.0
+        
+        import faiss
+        k_collab = min(k, self.item_index.ntotal)
+        params = faiss.SearchParametersHNSW(efSearch=max(64, k_collab))
+        _, inner_items = self.item_index.search(query, k_collab, params=params)
+        collab_candidates = self.item_positions[inner_items[0][inner_items[0] >= 0]]
+        
+        content_candidates = self._top_n_indices(np.where(rated_mask, -np.inf, content_scores), k)
+        
+        candidates = np.union1d(collab_candidates[collab_candidates >= 0], content_candidates)
+        return candidates[~rated_mask[candidates]]
+    
+    def _predict_ratings(self, user_id, inner_items):
+        """Biased SVD estimates for one user over many inner item ids (one int8 GEMV)"""
+        known = inner_items >= 0
+        known_items = inner_items[known]
+        scores = np.full(len(inner_items), self.global_mean)
+        scores[known] += self.bi[known_items]
+        
+        inner_user = self.svd_user_index.get(user_id)
+        if inner_user is not None:
+            scores += self.bu[inner_user]
+            dots = _int8_row_dots(self.qi_q, known_items, self.pu_q[inner_user])
+            scores[known] += dots * self.qi_scale[known_items] * self.pu_scale[inner_user]
+        
+        # Same clipping as Surprise's predict()
+        return np.clip(scores, *self.rating_scale)
+    
+    def _movie_positions(self, movie_ids):
+        """movies_df rows of the given movie ids, skipping ids not in the catalog"""
+        movie_ids = np.asarray(movie_ids, dtype=np.int64)
+        movie_ids = movie_ids[(movie_ids >= 0) & (movie_ids < len(self.movie_id_to_idx))]
+        positions = self.movie_id_to_idx[movie_ids]
+        return positions[positions >= 0]
     
     def _get_popular_movies(self, n=10):
         """Get popular movies based on number of ratings"""
-        if len(self.ratings_df) == 0:
+        if len(self.rating_value) == 0:
             # If no ratings, return random movies
             return self.movies_df.sample(n=n)['id'].tolist()
         
-        movie_ratings_count = self.ratings_df.groupby('movie_id').size()
-        movie_avg_rating = self.ratings_df.groupby('movie_id')['rating'].mean()
-        
-        # Combine count and average rating for popularity score
-        popularity = (movie_ratings_count * movie_avg_rating).sort_values(ascending=False)
-        
-        # Get top n movie IDs
-        top_movie_ids = popularity.head(n).index.tolist()
-        return top_movie_ids
+        # Get top n movie IDs from the precomputed ranking
+        return self.popular_movie_ids[:n].tolist()
     
-    def _is_in_watchlist(self, user_id, movie_id):
-        """Check if movie is in user's watchlist"""
-        if hasattr(self, 'watchlist_df') and self.watchlist_df is not None:
-            return ((self.watchlist_df['user_id'] == user_id) & 
-                    (self.watchlist_df['movie_id'] == movie_id)).any()
-        return False
+    def _get_user_rated_movie_ids(self, user_id):
+        """Movie ids the user has rated, read per request so new ratings count immediately"""
+        movie_ids = Rating.objects.filter(user_id=user_id).values_list('movie_id', flat=True)
+        return np.fromiter(movie_ids, dtype=np.int64)
     
-    def _get_vectorized_content_scores(self, rated_movie_ids):
-        """Get content-based scores using vectorized operations (no line-by-line)"""
-        if not rated_movie_ids:
-            return np.zeros(len(self.movies_df))
-        
-        # Get indices of rated movies
-        rated_indices = []
-        for movie_id in rated_movie_ids:
-            idx = self.movies_df[self.movies_df['id'] == movie_id].index
-            if len(idx) > 0:
-                rated_indices.append(idx[0])
-        
-        if not rated_indices:
+    def _get_vectorized_content_scores(self, rated_indices):
+        """Get content-based scores for all movies in a single NumPy reduction"""
+        if len(rated_indices) == 0:
             return np.zeros(len(self.movies_df))
         
-        # Vectorized similarity calculation
-        rated_similarities = self.content_similarity[:, rated_indices]
-        avg_similarities = np.mean(rated_similarities, axis=1)
-        
-        return avg_similarities
+        # Mean of the cosine similarities to the rated movies equals the dot
+        # product with their mean TF-IDF vector: one sparse GEMV, O(nnz)
+        rated_profile = np.asarray(self.tfidf_matrix[rated_indices].mean(axis=0)).ravel()
+        return self.tfidf_matrix @ rated_profile
 
-    def _get_vectorized_collaborative_scores(self, user_id, movie_ids):
-        """Get collaborative scores using vectorized operations (no line-by-line)"""
-        if self.svd_model is None:
-            return np.full(len(movie_ids), 3.0)  # Default rating
-        
-        # Create predictions in batch
-        predictions = []
-        for movie_id in movie_ids:
-            try:
-                prediction = self.svd_model.predict(user_id, movie_id)
-                predictions.append(prediction.est)
-            except:
-                predictions.append(3.0)  # Default if prediction fails
+    def _get_vectorized_collaborative_scores(self, user_id, movie_indices):
+        """Get collaborative scores for movies_df rows straight from the SVD factors"""
+        if self.qi_q is None:
+            return np.full(len(movie_indices), 3.0)  # Default rating
         
-        return np.array(predictions)
+        return self._predict_ratings(user_id, self.movie_inner_ids[movie_indices])
 
-    def _get_watchlist_boost_vectorized(self, user_id, movie_ids):
-        """Get watchlist boost using vectorized operations"""
-        if not hasattr(self, 'watchlist_df') or self.watchlist_df is None:
+    def _get_watchlist_mask(self, user_id, movie_ids):
+        """Get 1.0 for movies in the user's watchlist and 0.0 otherwise"""
+        # Read per request so watchlist changes get the boost right away
+        watched = np.fromiter(
+            Watchlist.objects.filter(user_id=user_id).order_by().values_list('movie_id', flat=True),
+            dtype=np.int64
+        )
+        if len(watched) == 0:
             return np.zeros(len(movie_ids))
         
-        # Create boolean array for watchlist status
-        user_watchlist = self.watchlist_df[self.watchlist_df['user_id'] == user_id]
-        watchlist_movie_ids = set(user_watchlist['movie_id'].tolist())
-        
-        boost = np.array([0.2 if movie_id in watchlist_movie_ids else 0.0 for movie_id in movie_ids])
-        return boost
+        return np.isin(movie_ids, watched).astype(np.float64)
+
+    def get_similar_movies(self, movie_id, n=5):
+        """Get the n movies most similar in content to the given movie"""
+        movie_indices = self._movie_positions([movie_id])
+        if len(movie_indices) == 0:
+            return []
+        
+        movie_idx = movie_indices[0]
+        similarities = (self.tfidf_matrix @ self.tfidf_matrix[movie_idx].T).toarray().ravel()
+        similarities[movie_idx] = -1  # Exclude the movie itself
+        
+        top_indices = self._top_n_indices(similarities, n)
+        return self.movies_df['id'].to_numpy()[top_indices].tolist()
+
+    @staticmethod
+    def _top_n_indices(scores, n):
+        """Indices of the n highest scores, best first, without sorting everything"""
+        if n < len(scores):
+            top = np.argpartition(-scores, n)[:n]
+        else:
+            top = np.arange(len(scores))
+        return top[np.argsort(-scores[top], kind='stable')]
 
     def get_recommendations_fast(self, user_id, n=10):
         """
@@ -243,56 +754,50 @@ class HybridRecommender:
         Returns:
             List of movie IDs
         """
-        print(f"Getting fast recommendations for user {user_id}...")
+        logger.debug("Getting fast recommendations for user %s...", user_id)
         
         # Check if user exists and has ratings
-        user_ratings = self.ratings_df[self.ratings_df['user_id'] == user_id]
+        rated_movie_ids = self._get_user_rated_movie_ids(user_id)
         
         # Cold start: return popular movies if user has no ratings
-        if len(user_ratings) == 0:
-            print(f"User {user_id} has no ratings, returning popular movies")
+        if len(rated_movie_ids) == 0:
+            logger.debug("User %s has no ratings, returning popular movies", user_id)
             return self._get_popular_movies(n)
         
-        # Get movies the user has rated
-        rated_movie_ids = user_ratings['movie_id'].tolist()
-        
-        # Get all movie IDs for vectorized operations
-        all_movie_ids = self.movies_df['id'].tolist()
-        all_movie_indices = self.movies_df.index.tolist()
-        
-        # Vectorized content-based scores for all movies
-        content_scores_all = self._get_vectorized_content_scores(rated_movie_ids)
-        content_scores_normalized = content_scores_all * 5  # Normalize to 0-5 scale
-        
-        # Get unrated movie indices
-        unrated_mask = ~self.movies_df['id'].isin(rated_movie_ids)
-        unrated_indices = self.movies_df[unrated_mask].index.tolist()
-        unrated_movie_ids = self.movies_df.loc[unrated_indices, 'id'].tolist()
+        # Mark rated movie positions through the id lookup, no DataFrame scan
+        rated_indices = self._movie_positions(rated_movie_ids)
+        rated_mask = np.zeros(len(self.movies_df), dtype=bool)
+        rated_mask[rated_indices] = True
         
-        if not unrated_movie_ids:
-            print(f"No unrated movies found for user {user_id}")
+        if rated_mask.all():
+            logger.debug("No unrated movies found for user %s", user_id)
             return self._get_popular_movies(n)
         
-        # Vectorized collaborative scores for unrated movies
-        collab_scores = self._get_vectorized_collaborative_scores(user_id, unrated_movie_ids)
+        content_scores = self._get_vectorized_content_scores(rated_indices)
         
-        # Vectorized watchlist boost for unrated movies
-        watchlist_boost = self._get_watchlist_boost_vectorized(user_id, unrated_movie_ids)
-        
-        # Get content scores for unrated movies
-        unrated_content_scores = content_scores_normalized[unrated_indices]
-        
-        # Hybrid score calculation (vectorized)
-        hybrid_scores = (0.4 * unrated_content_scores + 0.6 * collab_scores + watchlist_boost)
-        
-        # Create recommendations array
-        recommendations = list(zip(unrated_movie_ids, hybrid_scores))
-        
-        # Sort by hybrid score and return top n
-        recommendations.sort(key=lambda x: x[1], reverse=True)
-        top_recommendations = [rec[0] for rec in recommendations[:n]]
+        # Large catalogs only score a shortlist; otherwise every unrated movie
+        if self.item_index is not None:
+            candidate_indices = self._get_ann_candidates(user_id, content_scores, rated_mask, n)
+        else:
+            candidate_indices = np.flatnonzero(~rated_mask)
+        
+        candidate_movie_ids = self.movies_df['id'].to_numpy()[candidate_indices]
+        collab_scores = self._get_vectorized_collaborative_scores(user_id, candidate_indices)
+        watchlist_mask = self._get_watchlist_mask(user_id, candidate_movie_ids)
+        logger.debug("Boosted %d movies in watchlist", int(watchlist_mask.sum()))
+        
+        # Hybrid score and top-n selection run as one compiled kernel. Inputs are
+        # always float64 (content scores come out of the float32 TF-IDF matrix)
+        # so only the specialization compiled by warm_up() is ever used
+        top_indices, _ = _score_and_topk(
+            content_scores[candidate_indices].astype(np.float64),
+            collab_scores.astype(np.float64, copy=False),
+            watchlist_mask.astype(np.float64, copy=False),
+            int(n)
+        )
+        top_recommendations = candidate_movie_ids[top_indices].tolist()
         
-        print(f"Generated {len(top_recommendations)} recommendations using vectorized operations")
+        logger.debug("Generated %d recommendations using vectorized operations", len(top_recommendations))
         return top_recommendations
 
     def get_recommendations(self, user_id, n=10):
@@ -12,7 +12,7 @@ from django.views.decorators.cache import cache_page
 
 from .models import Movie, Rating, Watchlist
 from .forms import RatingForm
-from .recommender_engine import HybridRecommender
+from .recommender_engine import get_recommender
 
 
 def home(request):
@@ -32,7 +32,7 @@ def home(request):
     recommended_movies = []
     if request.user.is_authenticated:
         try:
-            recommender = HybridRecommender()
+            recommender = get_recommender()
             recommended_movie_ids = recommender.get_recommendations(
                 user_id=request.user.id, 
                 n=20
@@ -166,15 +166,15 @@ def movie_detail(request, movie_id):
     
     # Get similar movies (content-based)
     try:
-        recommender = HybridRecommender()
-        movie_idx = recommender.movies_df[recommender.movies_df['id'] == movie.id].index[0]
-        similar_indices = recommender.content_similarity[movie_idx].argsort()[-6:-1][::-1]
-        similar_movies = []
-        for idx in similar_indices:
-            similar_movie_id = recommender.movies_df.iloc[idx]['id']
-            similar_movie = Movie.objects.get(id=similar_movie_id)
-            similar_movies.append(similar_movie)
+        recommender = get_recommender()
+        similar_movie_ids = recommender.get_similar_movies(movie.id, n=5)
+        movies_by_id = Movie.objects.in_bulk(similar_movie_ids)
+        similar_movies = [movies_by_id[movie_id] for movie_id in similar_movie_ids if movie_id in movies_by_id]
     except Exception as e:
+        similar_movies = []
+    
+    # Movies added after the recommender loaded have no similarity scores yet
+    if not similar_movies:
         similar_movies = Movie.objects.exclude(id=movie.id)[:5]
     
     context = {
@@ -315,7 +315,7 @@ def load_more(request, category):
         ).filter(avg_rating__isnull=False).order_by('-avg_rating')
     elif category == 'recommended' and request.user.is_authenticated:
         try:
-            recommender = HybridRecommender()
+            recommender = get_recommender()
             recommended_movie_ids = recommender.get_recommendations(
                 user_id=request.user.id, 
                 n=100  # Get more for pagination
@@ -364,7 +364,7 @@ def load_more(request, category):
 def recommendations(request):
     """Get movie recommendations for the logged-in user"""
     try:
-        recommender = HybridRecommender()
+        recommender = get_recommender()
         recommended_movie_ids = recommender.get_recommendations(
             user_id=request.user.id, 
             n=20
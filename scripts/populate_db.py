@@ -2,7 +2,8 @@ import os
 import sys
 import csv
 import time
-import requests
+import asyncio
+import aiohttp
 from django.db import transaction
 
 # Setup Django environment
@@ -18,10 +19,32 @@ from django.contrib.auth.models import User
 # Configuration
 TMDB_API_KEY = ""  # Skip TMDb API for now
 TMDB_BASE_URL = "https://api.themoviedb.org/3"
-SLEEP_TIME = 0.1  # Rate limiting sleep time in seconds
+MAX_CONCURRENT_REQUESTS = 20  # Simultaneous TMDb requests
+REQUESTS_PER_SECOND = 40  # TMDb rate limit
 MAX_MOVIES = 100  # Only process first 100 movies for testing
 
-def get_tmdb_movie_details(tmdb_id):
+class RateLimiter:
+    """Space requests at least 1/rate seconds apart
+
+    Equivalent to a token bucket that starts empty and holds a single token,
+    so no one-second window ever sees more than `rate` requests (a full
+    bucket of `rate` tokens would allow a burst of up to twice that).
+    """
+    
+    def __init__(self, rate):
+        self.interval = 1 / rate
+        self.next_at = time.monotonic()
+        self.lock = asyncio.Lock()
+    
+    async def acquire(self):
+        async with self.lock:
+            delay = self.next_at - time.monotonic()
+            while delay > 0:
+                await asyncio.sleep(delay)
+                delay = self.next_at - time.monotonic()
+            self.next_at = time.monotonic() + self.interval
+
+async def get_tmdb_movie_details(session, tmdb_id, semaphore, rate_limiter):
     """Get movie details from TMDb API"""
     url = f"{TMDB_BASE_URL}/movie/{tmdb_id}"
     params = {
@@ -29,22 +52,38 @@ def get_tmdb_movie_details(tmdb_id):
         'language': 'en-US'
     }
     
-    try:
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        
-        overview = data.get('overview', '')
-        poster_path = data.get('poster_path', '')
-        poster_url = f"https://image.tmdb.org/t/p/w500{poster_path}" if poster_path else None
-        
-        return overview, poster_url
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching TMDb data for ID {tmdb_id}: {e}")
-        return None, None
-    except Exception as e:
-        print(f"Unexpected error for ID {tmdb_id}: {e}")
-        return None, None
+    async with semaphore:
+        await rate_limiter.acquire()
+        try:
+            async with session.get(url, params=params) as response:
+                response.raise_for_status()
+                data = await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Error fetching TMDb data for ID {tmdb_id}: {e}")
+            return None, None
+        except Exception as e:
+            print(f"Unexpected error for ID {tmdb_id}: {e}")
+            return None, None
+    
+    overview = data.get('overview', '')
+    poster_path = data.get('poster_path', '')
+    poster_url = f"https://image.tmdb.org/t/p/w500{poster_path}" if poster_path else None
+    
+    return overview, poster_url
+
+async def fetch_all_tmdb_details(tmdb_ids):
+    """Fetch TMDb details concurrently over one keep-alive session"""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    rate_limiter = RateLimiter(REQUESTS_PER_SECOND)
+    timeout = aiohttp.ClientTimeout(total=10)
+    
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        results = await asyncio.gather(*[
+            get_tmdb_movie_details(session, tmdb_id, semaphore, rate_limiter)
+            for tmdb_id in tmdb_ids
+        ])
+    
+    return dict(zip(tmdb_ids, results))
 
 def populate_movies():
     """Populate Movie objects with sample data (no TMDb API)"""
@@ -152,6 +191,27 @@ def populate_movies():
     except Exception as e:
         print(f"Error bulk creating movies: {e}")
 
+def populate_tmdb_details():
+    """Fill in overview and poster for movies without a poster using TMDb"""
+    movies = list(Movie.objects.filter(poster_url__isnull=True)[:MAX_MOVIES])
+    if not movies:
+        print("All movies already have TMDb details")
+        return
+    
+    details = asyncio.run(fetch_all_tmdb_details([movie.tmdb_id for movie in movies]))
+    
+    movies_to_update = []
+    for movie in movies:
+        overview, poster_url = details[movie.tmdb_id]
+        if overview is None:
+            continue
+        movie.overview = overview or movie.overview
+        movie.poster_url = poster_url
+        movies_to_update.append(movie)
+    
+    Movie.objects.bulk_update(movies_to_update, ['overview', 'poster_url'], batch_size=1000)
+    print(f"Updated {len(movies_to_update)} movies with TMDb details")
+
 def populate_ratings():
     """Populate Rating objects with sample data"""
     # Get all movies from the database
@@ -197,7 +257,11 @@ def main():
     print("Step 1: Populating movies...")
     populate_movies()
     
-    print("Step 2: Populating ratings...")
+    if TMDB_API_KEY:
+        print("Step 2: Fetching TMDb details...")
+        populate_tmdb_details()
+    
+    print("Step 3: Populating ratings...")
     populate_ratings()
     
     print("Database population completed!")
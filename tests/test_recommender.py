@@ -1,15 +1,31 @@
-from django.test import TestCase
+import asyncio
+import importlib.util
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+import numpy as np
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
 from django.contrib.auth.models import User
 from django.urls import reverse
-from recommender.models import Movie, Rating
+from recommender import recommender_engine
+from recommender.models import Movie, Rating, Watchlist
 from recommender.forms import RatingForm
-from recommender.recommender_engine import HybridRecommender
+from recommender.recommender_engine import HybridRecommender, get_recommender, _score_and_topk, _write_cache_atomically
 from django.db import connection
 
 
 class HybridRecommenderTestCase(TestCase):
     def setUp(self):
         """Set up test data"""
+        # Keep model caches out of the project directory
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        cache_settings = self.settings(RECOMMENDER_CACHE_DIR=cache_dir.name)
+        cache_settings.enable()
+        self.addCleanup(cache_settings.disable)
+        recommender_engine._INSTANCE = None
+        
         # Create test user
         self.user = User.objects.create_user(
             username='testuser',
@@ -96,6 +112,305 @@ class HybridRecommenderTestCase(TestCase):
             # as this is expected in test environment
             print(f"Recommender test skipped due to: {e}")
             self.assertTrue(True)
+    
+    def test_recommendations_reuse_warm_up_kernel_specialization(self):
+        """Test that scoring calls the kernel with the dtypes warm_up() compiles"""
+        # warm_up() closes the thread's DB connection when done; keep the test's
+        with mock.patch.object(recommender_engine.connection, 'close'):
+            recommender_engine.warm_up()
+        recommender_engine.get_recommender().get_recommendations(self.user.id, n=10)
+        self.assertEqual(len(_score_and_topk.signatures), 1)
+    
+    def test_popularity_ranks_movies_by_rating_sum(self):
+        """Test that popular movies are ranked by the sum of their ratings"""
+        other_user = User.objects.create_user(
+            username='otheruser',
+            password='testpass123'
+        )
+        Rating.objects.create(user=other_user, movie=self.movie2, rating=3.0)
+        
+        recommender = HybridRecommender()
+        movie_ids, sums, counts = recommender.movie_rating_stats
+        
+        self.assertEqual(movie_ids.tolist(), [self.movie1.id, self.movie2.id])
+        self.assertEqual(sums.tolist(), [4.5, 6.5])
+        self.assertEqual(counts.tolist(), [1, 2])
+        self.assertEqual(recommender._get_popular_movies(2), [self.movie2.id, self.movie1.id])
+    
+    def test_content_cache_is_rebuilt_when_movie_text_changes(self):
+        """Test that the cached TF-IDF matrix is only reused for the same catalog"""
+        recommender = HybridRecommender()
+        Movie.objects.filter(pk=self.movie3.pk).update(overview="Space pirates and robots")
+        updated = HybridRecommender()
+        
+        row = updated._movie_positions([self.movie3.id])[0]
+        self.assertNotEqual(
+            (recommender.tfidf_matrix[row] != updated.tfidf_matrix[row]).nnz, 0
+        )
+    
+    def _create_svd_ratings(self):
+        """Add enough ratings (12 movies x 10 users) to train the SVD model"""
+        movies = [
+            Movie.objects.create(title=f"SVD Movie {i}", genre="Drama", release_year=2020, tmdb_id=100 + i)
+            for i in range(12)
+        ]
+        for u in range(10):
+            user = User.objects.create_user(username=f'svduser{u}', password='testpass123')
+            for i, movie in enumerate(movies):
+                Rating.objects.create(user=user, movie=movie, rating=1 + (u + i) % 5)
+    
+    def test_stale_svd_factors_are_updated_with_new_ratings(self):
+        """Test that a stale SVD cache is warm-started instead of retrained"""
+        self._create_svd_ratings()
+        recommender = HybridRecommender()
+        self.assertNotIn(self.movie3.id, recommender.svd_item_index)
+        
+        Rating.objects.create(user=self.user, movie=self.movie3, rating=5.0)
+        updated = HybridRecommender()
+        self.assertEqual(updated.svd_updates, 1)
+        
+        # The new movie is appended to the existing factors
+        n_items = len(recommender.qi_q)
+        self.assertEqual(len(updated.qi_q), n_items + 1)
+        self.assertEqual(updated.svd_item_index[self.movie3.id], n_items)
+        self.assertIn(self.user.id, updated.svd_user_index)
+        
+        # Factors of the items already trained on only move slightly
+        qi_before = recommender.qi_q * recommender.qi_scale[:, None]
+        qi_after = updated.qi_q[:n_items] * updated.qi_scale[:n_items, None]
+        self.assertLess(np.abs(qi_after - qi_before).max(), 0.01)
+        self.assertLess(np.abs(updated.bi[:n_items] - recommender.bi).max(), 0.05)
+    
+    def test_svd_factors_are_retrained_when_trained_ratings_change(self):
+        """Test that edits and the update limit fall back to a full retrain"""
+        self._create_svd_ratings()
+        HybridRecommender()
+        
+        # Editing a rating in place keeps its timestamp but changes the data
+        Rating.objects.filter(user__username='svduser0').update(rating=5.0)
+        self.assertEqual(HybridRecommender().svd_updates, 0)
+        
+        Rating.objects.create(user=self.user, movie=self.movie3, rating=5.0)
+        with self.settings(RECOMMENDER_SVD_MAX_UPDATES=0):
+            retrained = HybridRecommender()
+        self.assertEqual(retrained.svd_updates, 0)
+        
+        # The cache now matches the data and is loaded as is
+        recommender = HybridRecommender()
+        self.assertEqual(recommender.svd_updates, 0)
+        self.assertTrue(np.array_equal(recommender.qi_q, retrained.qi_q))
+    
+    def test_ann_candidates_match_exact_scoring(self):
+        """Test that the HNSW shortlist gives the same top-n as scoring every movie"""
+        self._create_svd_ratings()
+        with self.settings(RECOMMENDER_ANN_MIN_MOVIES=1), \
+                mock.patch.object(recommender_engine, 'ANN_CANDIDATE_FACTOR', 2):
+            recommender = HybridRecommender()
+            self.assertIsNotNone(recommender.item_index)
+            
+            # The shortlist is smaller than the catalog, so the ANN path matters
+            rated_mask = np.zeros(len(recommender.movies_df), dtype=bool)
+            rated_mask[recommender._movie_positions([self.movie1.id, self.movie2.id])] = True
+            candidates = recommender._get_ann_candidates(
+                self.user.id, np.zeros(len(rated_mask)), rated_mask, 3
+            )
+            self.assertLess(len(candidates), (~rated_mask).sum())
+            
+            ann_top = recommender.get_recommendations(self.user.id, n=3)
+            
+            # The index is persisted with the factors and reused on load
+            cached = HybridRecommender()
+            with np.load(cached.cache_dir / 'svd_factors.npz') as factors:
+                self.assertIn('item_index', factors.files)
+            self.assertEqual(cached.item_index.ntotal, recommender.item_index.ntotal)
+            self.assertEqual(cached.get_recommendations(self.user.id, n=3), ann_top)
+        
+        recommender.item_index = None
+        self.assertEqual(recommender.get_recommendations(self.user.id, n=3), ann_top)
+    
+    def test_movie_detail_falls_back_for_movies_added_after_load(self):
+        """Test that a movie the shared recommender does not know still gets similar movies"""
+        get_recommender()
+        new_movie = Movie.objects.create(title="New Movie", genre="Drama", release_year=2024, tmdb_id=99)
+        
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get(reverse('recommender:movie_detail', args=[new_movie.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['similar_movies']), 3)
+    
+    def test_recommendations_use_current_user_data_without_rebuild(self):
+        """Test that new ratings and watchlist entries apply before any rebuild"""
+        recommender = HybridRecommender()
+        self.assertIn(self.movie3.id, recommender.get_recommendations(self.user.id, n=10))
+        
+        # A freshly rated movie is no longer recommended
+        Rating.objects.create(user=self.user, movie=self.movie3, rating=1.0)
+        self.assertNotIn(self.movie3.id, recommender.get_recommendations(self.user.id, n=10))
+        
+        # A new user's first rating moves them off the popular list
+        new_user = User.objects.create_user(username='newuser', password='testpass123')
+        Rating.objects.create(user=new_user, movie=self.movie1, rating=1.0)
+        self.assertNotIn(self.movie1.id, recommender.get_recommendations(new_user.id, n=10))
+        
+        # Watchlist additions get the boost straight away
+        Watchlist.objects.create(user=new_user, movie=self.movie3)
+        mask = recommender._get_watchlist_mask(new_user.id, [self.movie2.id, self.movie3.id])
+        self.assertEqual(mask.tolist(), [0.0, 1.0])
+
+
+class SharedRecommenderTestCase(TransactionTestCase):
+    """get_recommender() rebuilds in a background thread, which needs committed data"""
+    
+    def setUp(self):
+        """Set up test data"""
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        cache_settings = self.settings(
+            RECOMMENDER_CACHE_DIR=cache_dir.name,
+            RECOMMENDER_REBUILD_THRESHOLD=0,
+            RECOMMENDER_STALE_CHECK_INTERVAL=0
+        )
+        cache_settings.enable()
+        self.addCleanup(cache_settings.disable)
+        recommender_engine._INSTANCE = None
+        
+        self.user = User.objects.create_user(
+            username='testuser',
+            password='testpass123'
+        )
+        self.movies = [
+            Movie.objects.create(title=f"Test Movie {i}", genre="Drama", release_year=2020, tmdb_id=i)
+            for i in range(1, 4)
+        ]
+        Rating.objects.create(user=self.user, movie=self.movies[0], rating=4.5)
+    
+    def _wait_for_rebuild(self):
+        """Block until a running background rebuild has swapped in its instance"""
+        with recommender_engine._REBUILD_LOCK:
+            pass
+    
+    def test_get_recommender_serves_old_instance_during_rebuild(self):
+        """Test that requests get the current instance while the rebuild runs"""
+        recommender = get_recommender()
+        Rating.objects.create(user=self.user, movie=self.movies[1], rating=5.0)
+        
+        # Simulate a rebuild in progress elsewhere
+        with recommender_engine._REBUILD_LOCK:
+            self.assertIs(get_recommender(), recommender)
+        
+        # The request that notices staleness returns at once as well
+        self.assertIs(get_recommender(), recommender)
+        self._wait_for_rebuild()
+        self.assertIsNot(get_recommender(), recommender)
+    
+    def test_get_recommender_reuses_instance_until_stale(self):
+        """Test that the shared recommender is only rebuilt after new ratings"""
+        recommender = get_recommender()
+        self.assertIs(get_recommender(), recommender)
+        self._wait_for_rebuild()
+        self.assertIs(get_recommender(), recommender)
+        
+        # A new rating past the threshold triggers a rebuild
+        Rating.objects.create(user=self.user, movie=self.movies[2], rating=5.0)
+        get_recommender()
+        self._wait_for_rebuild()
+        self.assertIsNot(get_recommender(), recommender)
+    
+    def test_get_recommender_rebuilds_when_catalog_changes(self):
+        """Test that added movies make the shared recommender stale"""
+        recommender = get_recommender()
+        new_movie = Movie.objects.create(title="New Movie", genre="Drama", release_year=2024, tmdb_id=99)
+        
+        get_recommender()
+        self._wait_for_rebuild()
+        self.assertIsNot(get_recommender(), recommender)
+        self.assertIn(new_movie.id, get_recommender().get_similar_movies(self.movies[0].id, n=5))
+
+
+class ScoreAndTopkTestCase(SimpleTestCase):
+    def _expected(self, scores, n):
+        """Reference top-n: full stable sort, ties kept in catalog order"""
+        return np.argsort(-scores, kind='stable')[:n].tolist()
+    
+    def test_score_and_topk_matches_stable_sort_with_ties(self):
+        """Test that tied scores are filled in catalog order for every n"""
+        # Collaborative scores only, with large tie groups
+        collab = np.array([3.0, 4.0, 3.0, 5.0, 4.0, 3.0, 4.0, 3.0, 5.0, 3.0])
+        content = np.zeros(len(collab))
+        watch = np.zeros(len(collab))
+        scores = 0.6 * collab
+        
+        # n = 0, n inside the 5.0 / 4.0 / 3.0 tie groups, n >= len
+        for n in [0, 1, 2, 3, 4, 5, 6, 7, 9, 10, 15]:
+            top, top_scores = _score_and_topk(content, collab, watch, n)
+            self.assertEqual(top.tolist(), self._expected(scores, n), f"n={n}")
+            self.assertTrue(np.allclose(top_scores, scores[top]))
+    
+    def test_score_and_topk_all_scores_equal(self):
+        """Test that equal scores come back in catalog order"""
+        ones = np.ones(8)
+        top, _ = _score_and_topk(ones, ones, ones, 5)
+        self.assertEqual(top.tolist(), [0, 1, 2, 3, 4])
+    
+    def test_score_and_topk_random_ties(self):
+        """Test the kernel against a stable sort on random heavily tied scores"""
+        rng = np.random.default_rng(0)
+        for _ in range(50):
+            size = int(rng.integers(1, 40))
+            content = rng.integers(0, 3, size) / 2.0
+            collab = rng.integers(1, 4, size).astype(np.float64)
+            watch = rng.integers(0, 2, size).astype(np.float64)
+            scores = 0.4 * 5.0 * content + 0.6 * collab + 0.2 * watch
+            n = int(rng.integers(0, size + 3))
+            top, _ = _score_and_topk(content, collab, watch, n)
+            self.assertEqual(top.tolist(), self._expected(scores, n))
+
+
+class CacheWriteTestCase(SimpleTestCase):
+    def test_failed_cache_write_keeps_previous_file(self):
+        """Test that a cache file is replaced whole or not at all"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache_file = Path(cache_dir) / 'svd_factors.npz'
+            _write_cache_atomically(cache_file, lambda path: np.savez(path, value=np.arange(3)))
+            
+            def failing_write(path):
+                Path(path).write_bytes(b'partial')
+                raise OSError("disk full")
+            
+            with self.assertRaises(OSError):
+                _write_cache_atomically(cache_file, failing_write)
+            
+            with np.load(cache_file) as cached:
+                self.assertEqual(cached['value'].tolist(), [0, 1, 2])
+            self.assertEqual([p.name for p in Path(cache_dir).iterdir()], ['svd_factors.npz'])
+
+
+class RateLimiterTestCase(SimpleTestCase):
+    def _load_populate_db(self):
+        """Import scripts/populate_db.py, which is not part of a package"""
+        path = Path(__file__).resolve().parent.parent / 'scripts' / 'populate_db.py'
+        spec = importlib.util.spec_from_file_location('populate_db', path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+    
+    def test_rate_limiter_never_exceeds_rate_in_any_second(self):
+        """Test that no one-second window sees more than `rate` requests"""
+        rate_limiter = self._load_populate_db().RateLimiter(100)
+        
+        async def run():
+            times = []
+            
+            async def request():
+                await rate_limiter.acquire()
+                times.append(time.monotonic())
+            
+            await asyncio.gather(*[request() for _ in range(150)])
+            return times
+        
+        times = np.sort(asyncio.run(run()))
+        in_window = np.searchsorted(times, times + 1.0, side='left') - np.arange(len(times))
+        self.assertLessEqual(in_window.max(), 100)
 
 
 class RatingFormTestCase(TestCase):